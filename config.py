@@ -1,6 +1,16 @@
 import os
+import json
+from collections import OrderedDict
 import yaml
 
+# Prefer the libyaml-backed loader/dumper when available
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Parsed config files keyed by absolute path -> (mtime, size, data)
+_PARSE_CACHE = OrderedDict()
+_PARSE_CACHE_MAX = 100
+
 class Config:
     def __init__(self):
         self.config_path = os.path.expanduser("~/.smart_term_config.yaml")
@@ -11,6 +21,75 @@ class Config:
         self.language = None
         self.max_context_chars = 10000
         self.log_summary_length = 100
+        # os.stat result of the config file found by load(), if any
+        self._config_stat = None
+
+    @staticmethod
+    def _json_path(path):
+        """Returns the JSON sidecar path written next to a YAML config file."""
+        return os.path.splitext(path)[0] + ".json"
+
+    @staticmethod
+    def _write_json(path, data, mode):
+        """
+        Writes the JSON sidecar with the given permission bits, ignoring
+        failures (e.g. a read-only directory).
+        """
+        tmp_path = path + ".tmp"
+        try:
+            # It holds the API key, so it gets the YAML file's mode rather
+            # than the umask default; fchmod covers a leftover temp file
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+            os.fchmod(fd, mode)
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            # Replaced atomically so a concurrent load never sees a partial file
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _parse(self, path, st=None):
+        """
+        Parses the config file at path, reusing the cached result while the
+        file's mtime and size are unchanged. A JSON sidecar written by save()
+        is used instead when it was written from exactly this version of the
+        YAML file.
+        """
+        key = os.path.abspath(path)
+        if st is None:
+            st = os.stat(key)
+
+        cached = _PARSE_CACHE.get(key)
+        if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+            _PARSE_CACHE.move_to_end(key)
+            return cached[2]
+
+        data = None
+        try:
+            with open(self._json_path(key), 'r', encoding='utf-8') as f:
+                sidecar = json.load(f)
+            # Compared for equality, not recency: tools like cp -p or tar
+            # can give the YAML an older mtime than a stale sidecar
+            if sidecar.get("source") == [st.st_mtime_ns, st.st_size]:
+                data = sidecar.get("config")
+        except (OSError, ValueError, AttributeError):
+            pass
+        if data is None:
+            with open(key, 'r', encoding='utf-8') as f:
+                data = yaml.load(f, Loader=Loader)
+        if data:
+            # Normalize keys to handle potential leading/trailing whitespace
+            data = {k.strip(): v for k, v in data.items() if isinstance(k, str)}
+        else:
+            data = {}
+
+        _PARSE_CACHE[key] = (st.st_mtime, st.st_size, data)
+        if len(_PARSE_CACHE) > _PARSE_CACHE_MAX:
+            _PARSE_CACHE.popitem(last=False)
+        return data
 
     def load(self):
         """
@@ -24,26 +103,28 @@ class Config:
             os.path.expanduser("~/.smart_term_config.yaml")
         ]
         
+        # One stat per candidate; the result is reused when parsing
+        self._config_stat = None
         for path in search_paths:
-            if os.path.exists(path):
-                self.config_path = path
-                break
+            try:
+                self._config_stat = os.stat(path)
+            except OSError:
+                continue
+            self.config_path = path
+            break
         
-        if os.path.exists(self.config_path):
+        if self._config_stat:
             try:
-                with open(self.config_path, 'r') as f:
-                    data = yaml.safe_load(f)
-                    if data:
-                        # Normalize keys to handle potential leading/trailing whitespace
-                        data = {k.strip(): v for k, v in data.items() if isinstance(k, str)}
-                        
-                        self.provider = data.get('provider', self.provider)
-                        self.api_key = data.get('api_key', self.api_key)
-                        self.model = data.get('model', self.model)
-                        self.base_url = data.get('base_url', self.base_url)
-                        self.language = data.get('language', self.language)
-                        self.max_context_chars = data.get('max_context_chars', self.max_context_chars)
-                        self.log_summary_length = data.get('log_summary_length', self.log_summary_length)
+                # Fields are copied out as scalars, so the cached dict is shared as-is
+                data = self._parse(self.config_path, self._config_stat)
+                if data:
+                    self.provider = data.get('provider', self.provider)
+                    self.api_key = data.get('api_key', self.api_key)
+                    self.model = data.get('model', self.model)
+                    self.base_url = data.get('base_url', self.base_url)
+                    self.language = data.get('language', self.language)
+                    self.max_context_chars = data.get('max_context_chars', self.max_context_chars)
+                    self.log_summary_length = data.get('log_summary_length', self.log_summary_length)
             except Exception as e:
                 print(f"Warning: Failed to load config file: {e}")
         
@@ -71,7 +152,12 @@ class Config:
 
         try:
             with open(self.config_path, 'w') as f:
-                yaml.dump(data, f, default_flow_style=False)
+                yaml.dump(data, f, Dumper=Dumper, default_flow_style=False)
+            # Tagged with the YAML's stat so a later edit or restore of the
+            # YAML is noticed
+            st = os.stat(self.config_path)
+            sidecar = {"source": [st.st_mtime_ns, st.st_size], "config": data}
+            self._write_json(self._json_path(self.config_path), sidecar, st.st_mode & 0o777)
             print(f"Configuration saved to {self.config_path}")
         except Exception as e:
             print(f"Error saving configuration: {e}")
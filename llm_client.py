@@ -8,6 +8,13 @@ try:
     import google.generativeai as genai
 except ImportError:
     genai = None
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+class LLMStreamError(Exception):
+    """Raised by a streaming call that failed; the message is shown to the user."""
 
 class LLMProvider(ABC):
     @abstractmethod
@@ -15,19 +22,37 @@ class LLMProvider(ABC):
         pass
 
     @abstractmethod
-    def chat(self, messages: list) -> str:
+    def chat(self, messages: list, cache: bool = True) -> str:
+        """
+        Answers the conversation in messages. cache=False marks a one-off
+        request that must not touch any per-conversation state, so it is
+        safe to call from a worker thread.
+        """
         pass
 
-    def _get_language_instruction(self, language: str) -> str:
+    def set_language(self, language: str):
+        """
+        Switches the answer language in place, keeping the underlying client.
+        The system prompt carries the language instruction, so messages are
+        sent without per-call edits.
+        """
+        self.language = language
         if language == 'cn':
-            return "\n\n(Please answer in Chinese)"
+            self.system_prompt = SYSTEM_PROMPT_CN
         else:
-            return "\n\n(Please answer in English)"
+            self.system_prompt = SYSTEM_PROMPT_EN
+
+    def _with_system_prompt(self, messages: list) -> list:
+        """Prepends the system prompt unless the caller supplied one."""
+        if messages and messages[0]["role"] == "system":
+            return messages
+        return [{"role": "system", "content": self.system_prompt}] + list(messages)
 
 SYSTEM_PROMPT_EN = (
     "You are a Linux system expert specializing in resolving various Linux system issues. "
     "Analyze the provided Linux command log to determine what occurred. "
-    "If the log contains alerts or errors, provide a solution after analyzing the situation."
+    "If the log contains alerts or errors, provide a solution after analyzing the situation. "
+    "Always answer in English."
 )
 
 SYSTEM_PROMPT_CN = (
@@ -37,18 +62,32 @@ SYSTEM_PROMPT_CN = (
     "请务必使用中文回答。"
 )
 
+def _make_http_client():
+    """
+    Builds a keep-alive HTTP client for the OpenAI SDK, using HTTP/2 when the
+    optional h2 package is available.
+    """
+    if httpx is None:
+        return None
+    # A handful of idle connections covers the explanation and the
+    # concurrent summary request
+    limits = httpx.Limits(max_keepalive_connections=4, keepalive_expiry=60)
+    try:
+        return httpx.Client(http2=True, limits=limits)
+    except ImportError:
+        return httpx.Client(limits=limits)
+
 class OpenAIProvider(LLMProvider):
     def __init__(self, api_key: str, model: str, base_url: str = None, language: str = "en"):
         if OpenAI is None:
             raise ImportError("openai package is not installed. Please install it with `pip install openai`")
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
-        self.model = model
-        self.language = language
-        
-        if language == 'cn':
-            self.system_prompt = SYSTEM_PROMPT_CN
+        self._http = _make_http_client()
+        if self._http is not None:
+            self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=self._http)
         else:
-            self.system_prompt = SYSTEM_PROMPT_EN
+            self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.model = model
+        self.set_language(language)
 
     def generate_explanation(self, context: str) -> str:
         try:
@@ -56,98 +95,146 @@ class OpenAIProvider(LLMProvider):
                 model=self.model,
                 messages=[
                     {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": f"Terminal output:\n{context}{self._get_language_instruction(self.language)}"}
+                    {"role": "user", "content": f"Terminal output:\n{context}"}
                 ]
             )
             return response.choices[0].message.content
         except Exception as e:
             return f"Error calling OpenAI: {e}"
 
-    def chat(self, messages: list) -> str:
+    def chat(self, messages: list, cache: bool = True) -> str:
+        # Stateless; cache is accepted for interface compatibility
         try:
-            # Append language instruction to the last user message
-            messages_to_send = list(messages)
-            if messages_to_send and messages_to_send[-1]["role"] == "user":
-                last_msg = messages_to_send[-1].copy()
-                last_msg["content"] += self._get_language_instruction(self.language)
-                messages_to_send[-1] = last_msg
-
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=messages_to_send
+                messages=self._with_system_prompt(messages)
             )
             return response.choices[0].message.content
         except Exception as e:
             return f"Error calling OpenAI: {e}"
 
+    def chat_stream(self, messages: list):
+        """
+        Streaming variant of chat; yields text as it arrives and raises
+        LLMStreamError if the request fails.
+        """
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=self._with_system_prompt(messages),
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+        except Exception as e:
+            raise LLMStreamError(f"Error calling OpenAI: {e}") from e
+
+# Maximum number of cached Gemini chat sessions
+_MAX_GEMINI_SESSIONS = 8
+
 class GeminiProvider(LLMProvider):
     def __init__(self, api_key: str, model: str, language: str = "en"):
         if genai is None:
             raise ImportError("google-generativeai package is not installed. Please install it with `pip install google-generativeai`")
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel(model)
-        self.language = language
-        
-        if language == 'cn':
-            self.system_prompt = SYSTEM_PROMPT_CN
-        else:
-            self.system_prompt = SYSTEM_PROMPT_EN
+        # Live chat sessions keyed by the conversation's opening messages, so
+        # follow-up turns only send the new message instead of rebuilding history
+        self._sessions = {}
+        self.set_language(language)
+
+    def set_language(self, language: str):
+        super().set_language(language)
+        # Cached sessions were primed for the previous language
+        self._sessions.clear()
 
     def generate_explanation(self, context: str) -> str:
         try:
-            prompt = f"{self.system_prompt}\n\nTerminal output:\n{context}{self._get_language_instruction(self.language)}"
+            prompt = f"{self.system_prompt}\n\nTerminal output:\n{context}"
             response = self.model.generate_content(prompt)
             return response.text
         except Exception as e:
             return f"Error calling Gemini: {e}"
 
-    def chat(self, messages: list) -> str:
-        try:
-            # Convert OpenAI-style messages to Gemini history
-            # Note: Gemini system prompt is usually set at model init or prepended.
-            # Here we will just construct a chat session or simple prompt.
-            # For simplicity and statelessness in this method, we'll use a chat session with history.
-            
-            history = []
-            last_user_message = ""
-            
-            for msg in messages:
-                role = msg["role"]
-                content = msg["content"]
-                
-                if role == "system":
-                    # Prepend system prompt to the first user message or handle separately
-                    # For now, let's just ignore it in history and assume the model knows context, 
-                    # OR better, prepend it to the next user message if it's the first one.
-                    # But since we initialized the model with a system prompt logic in generate_explanation,
-                    # we might want to respect that.
-                    # Actually, let's just use the content as is.
-                    pass 
-                elif role == "user":
-                    history.append({"role": "user", "parts": [content]})
-                    last_user_message = content
-                elif role == "assistant":
-                    history.append({"role": "model", "parts": [content]})
-            
-            # If the last message in history is the one we want to send, we should pop it?
-            # No, start_chat takes history (previous messages).
-            # We want to send the *last* message.
+    def _session_for(self, messages: list, cache: bool = True):
+        """
+        Returns (key, session, message) for the next turn. session is None
+        when messages can't be sent, with message holding the error text.
+        cache=False always builds a fresh session.
+        """
+        # Sessions are keyed by the conversation's first two messages;
+        # reuse the cached one when it has seen every earlier turn
+        key = tuple((msg["role"], msg["content"]) for msg in messages[:2])
+        turns = sum(1 for msg in messages if msg["role"] != "system")
+        session = self._sessions.get(key) if cache else None
+        if session is not None and messages and messages[-1]["role"] == "user" \
+                and len(session.history) == turns - 1:
+            return key, session, messages[-1]["content"]
+        
+        # Otherwise rebuild the Gemini history from the OpenAI-style messages;
+        # the system prompt is prepended to the first user message
+        history = []
+        
+        for msg in self._with_system_prompt(messages):
+            role = msg["role"]
+            content = msg["content"]
             
-            if not history:
-                return "Error: No messages to send."
-                
-            # The last message should be from user
-            if history[-1]["role"] != "user":
-                 return "Error: Last message must be from user."
-
-            current_message = history.pop() # Remove last message to send it as new input
+            if role == "system":
+                # Prepend system prompt to the first user message; it
+                # carries the language instruction
+                system_prompt = content
+            elif role == "user":
+                if not history:
+                    content = f"{system_prompt}\n\n{content}"
+                history.append({"role": "user", "parts": [content]})
+            elif role == "assistant":
+                history.append({"role": "model", "parts": [content]})
+        
+        if not history:
+            return key, None, "Error: No messages to send."
             
-            # Append language instruction
-            current_message_content = current_message["parts"][0]
-            current_message_content += self._get_language_instruction(self.language)
+        # The last message should be from user
+        if history[-1]["role"] != "user":
+            return key, None, "Error: Last message must be from user."
 
-            chat = self.model.start_chat(history=history)
-            response = chat.send_message(current_message_content)
+        current_message = history.pop() # Remove last message to send it as new input
+        return key, self.model.start_chat(history=history), current_message["parts"][0]
+
+    def _remember(self, key, session):
+        """Caches a session that has completed a turn."""
+        self._sessions.pop(key, None)
+        self._sessions[key] = session
+        if len(self._sessions) > _MAX_GEMINI_SESSIONS:
+            # Evict the least recently used session
+            self._sessions.pop(next(iter(self._sessions)), None)
+
+    def chat(self, messages: list, cache: bool = True) -> str:
+        try:
+            key, session, message = self._session_for(messages, cache)
+            if session is None:
+                return message
+            response = session.send_message(message)
+            if cache:
+                self._remember(key, session)
             return response.text
         except Exception as e:
             return f"Error calling Gemini: {e}"
+
+    def chat_stream(self, messages: list):
+        """
+        Streaming variant of chat; yields text as it arrives and raises
+        LLMStreamError if the request fails.
+        """
+        try:
+            key, session, message = self._session_for(messages)
+        except Exception as e:
+            raise LLMStreamError(f"Error calling Gemini: {e}") from e
+        if session is None:
+            raise LLMStreamError(message)
+        try:
+            for chunk in session.send_message(message, stream=True):
+                yield chunk.text
+        except Exception as e:
+            raise LLMStreamError(f"Error calling Gemini: {e}") from e
+        self._remember(key, session)
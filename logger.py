@@ -1,7 +1,11 @@
 import os
 import datetime
 import re
-import glob
+
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+_WHITESPACE_RE = re.compile(r'\s+')
+# Sequence number right after the hour prefix of a log filename
+_LOG_SEQ_RE = re.compile(r'_(\d+)_')
 
 class ConversationLogger:
     def __init__(self, base_dir="log", log_summary_length=50):
@@ -10,6 +14,9 @@ class ConversationLogger:
         # Cache the current log file path to append to it within the same hour
         self.current_log_file = None
         self.current_log_hour = None
+        # Open handle to the current log file, reused until the path changes
+        self._fh = None
+        self._fh_path = None
 
     def _get_log_dir(self, now):
         """Creates and returns the directory path for the given date."""
@@ -21,40 +28,31 @@ class ConversationLogger:
     def _generate_summary(self, text):
         """Generates a short summary from the text."""
         # Remove special characters and keep only alphanumerics and spaces
-        clean_text = re.sub(r'[^\w\s]', '', text).strip()
+        clean_text = _NON_WORD_RE.sub('', text).strip()
         # Collapse multiple spaces
-        clean_text = re.sub(r'\s+', ' ', clean_text)
+        clean_text = _WHITESPACE_RE.sub(' ', clean_text)
         return clean_text[:self.log_summary_length] if clean_text else "conversation"
 
     def _get_next_sequence(self, log_dir, hour_prefix):
         """Determines the next sequence number for the given hour."""
         # Pattern: YYYY-MM-DD_HH_SEQ_Summary.md
-        # We look for files starting with the hour prefix
-        pattern = os.path.join(log_dir, f"{hour_prefix}_*.md")
-        files = glob.glob(pattern)
+        # We look for files starting with the hour prefix; scandir avoids
+        # glob's fnmatch pass and extra stat calls
+        name_prefix = f"{hour_prefix}_"
         
         max_seq = 0
-        for f in files:
-            basename = os.path.basename(f)
-            # Expected format: YYYY-MM-DD_HH_SEQ_Summary.md
-            # Split by underscore. 
-            # YYYY-MM-DD_HH is 2 parts? No, YYYY-MM-DD is one part if we split by _.
-            # Actually date is YYYY-MM-DD.
-            # Let's parse carefully.
-            # basename starts with hour_prefix (YYYY-MM-DD_HH)
-            # The next part should be SEQ.
-            
-            try:
-                # Remove prefix
-                suffix = basename[len(hour_prefix)+1:] # +1 for underscore
-                # suffix is SEQ_Summary.md
-                parts = suffix.split('_')
-                if parts:
-                    seq = int(parts[0])
-                    if seq > max_seq:
-                        max_seq = seq
-            except (ValueError, IndexError):
-                continue
+        with os.scandir(log_dir) as entries:
+            names = [e.name for e in entries
+                     if e.name.startswith(name_prefix) and e.name.endswith(".md")]
+
+        # The sequence number follows the hour prefix: YYYY-MM-DD_HH_SEQ_Summary.md
+        offset = len(hour_prefix)
+        for basename in names:
+            m = _LOG_SEQ_RE.match(basename, offset)
+            if m:
+                seq = int(m.group(1))
+                if seq > max_seq:
+                    max_seq = seq
                 
         return max_seq + 1
 
@@ -67,7 +65,8 @@ class ConversationLogger:
         if self.current_log_hour != current_hour_str:
             log_dir = self._get_log_dir(now)
             
-            # Determine sequence number
+            # Determine sequence number; the directory is only scanned when
+            # the hour changes, as later logs that hour reuse the same file
             seq = self._get_next_sequence(log_dir, current_hour_str)
             
             if not summary:
@@ -82,14 +81,30 @@ class ConversationLogger:
 
         # Append to the log file
         try:
-            with open(self.current_log_file, "a", encoding="utf-8") as f:
-                f.write(f"## {now.strftime('%H:%M:%S')}\n\n")
-                f.write("### Context (Input)\n")
-                f.write("```\n")
-                f.write(context)
-                f.write("\n```\n\n")
-                f.write("### Explanation (AI Response)\n")
-                f.write(explanation)
-                f.write("\n\n---\n\n")
+            if self._fh_path != self.current_log_file:
+                self.close()
+                self._fh = open(self.current_log_file, "a", encoding="utf-8", buffering=8192)
+                self._fh_path = self.current_log_file
+            self._fh.write("".join([
+                f"## {now.strftime('%H:%M:%S')}\n\n",
+                "### Context (Input)\n",
+                "```\n",
+                context,
+                "\n```\n\n",
+                "### Explanation (AI Response)\n",
+                explanation,
+                "\n\n---\n\n",
+            ]))
+            self._fh.flush()
         except Exception as e:
             print(f"Error writing to log file: {e}")
+
+    def close(self):
+        """Closes the current log file handle, if any."""
+        if self._fh:
+            try:
+                self._fh.close()
+            except Exception as e:
+                print(f"Error closing log file: {e}")
+        self._fh = None
+        self._fh_path = None
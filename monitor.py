@@ -1,46 +1,141 @@
 import os
+import re
 import sys
 import pty
 import select
+import selectors
 import tty
 import termios
 import fcntl
 import struct
+import shutil
+import signal
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
+from rich.live import Live
 from rich.markdown import Markdown
 from rich.panel import Panel
 
 try:
-    from .llm_client import OpenAIProvider, GeminiProvider
+    from .llm_client import OpenAIProvider, GeminiProvider, LLMStreamError
 except ImportError:
-    from llm_client import OpenAIProvider, GeminiProvider
+    from llm_client import OpenAIProvider, GeminiProvider, LLMStreamError
 
 try:
     from .logger import ConversationLogger
 except ImportError:
     from logger import ConversationLogger
 
+# Trigger key (Ctrl+G), stripped from stdin before it reaches the shell
+_TRIGGER_KEY = b'\x07'
+# Ctrl+G or Enter, so a stdin read needs only one scan in the common case
+_SPECIAL_KEYS_RE = re.compile(rb'[\x07\r\n]')
+
+# ANSI escape sequences echoed by the pty (CSI colors/cursor moves, OSC titles,
+# charset and keypad switches); they only waste tokens when sent to the LLM
+_ANSI_RE = re.compile(r'\x1b(?:\[[0-9;?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[()][0-9A-Za-z]|[@-Z\\-_=>])')
+
+# Status messages, encoded once
+_MSG_NO_OUTPUT = b"\r\n\033[1;33m[SmartTerm] No output to analyze.\033[0m\r\n"
+_MSG_NO_LLM = b"\r\n\033[1;31m[SmartTerm] No LLM provider configured.\033[0m\r\n"
+# Messages with a number in the middle: only the number is encoded per use
+_MSG_TRUNCATED_HEAD = b"\r\n\033[1;33m[SmartTerm] Output truncated to last "
+_MSG_TRUNCATED_TAIL = b" chars.\033[0m"
+_MSG_ANALYZING_HEAD = b"\r\n\033[1;34m[SmartTerm] Analyzing "
+_MSG_ANALYZING_TAIL = b" chars...\033[0m\r\n"
+
+# Bytes requested per pty read, matching the typical pty buffer size
+_READ_SIZE = 65536
+# Bytes requested per stdin read; one page, so pastes need fewer reads
+_STDIN_READ_SIZE = 4096
+# Upper bound on reads drained per select wake so stdin (e.g. Ctrl+C) is
+# still serviced while a command floods the pty
+_MAX_DRAIN_READS = 16
+
+# Cheap log-filename summaries tried before asking the LLM: the command after a
+# shell prompt, then the first error/exception line. A prompt is an optional
+# "(venv) " prefix, then "[user@host dir]$", "user@host:dir$" (or "#" for
+# root) or anything ending in "$", so "## Heading" and "foo# bar" don't count
+_SUMMARY_PATTERNS = (
+    re.compile(r'^(?:\(\S+\)\s+)?(?:\[[^\]\n]*\][$#]|\S*[@:]\S*[$#]|\S*\$)\s+(\S.*?)\s*$', re.M),
+    re.compile(r'^\s*(.*?\b(?:\w*Error|\w*Exception|error|fatal)\b:.*?)\s*$', re.M),
+)
+
+# Minimum new streamed characters before re-rendering mid-line
+_RENDER_MIN_CHARS = 64
+
+# Number of recent (explanation, summary) pairs kept per monitor
+_EXPLAIN_CACHE_SIZE = 128
+
+def _write_all(fd, data):
+    """Writes all of data to a possibly non-blocking fd."""
+    view = memoryview(data)
+    while view:
+        try:
+            n = os.write(fd, view)
+        except BlockingIOError:
+            select.select([], [fd], [])
+            continue
+        view = view[n:]
+
 class TerminalMonitor:
     def __init__(self, config):
         self.config = config
         self.shell = os.environ.get('SHELL', '/bin/bash')
+        self._stdin_fd = sys.stdin.fileno()
+        self._stdout_fd = sys.stdout.fileno()
+        # Reused across triggers instead of being rebuilt on every Ctrl+G
+        self._console = Console(force_terminal=True, width=self._terminal_width())
+        # Set by SIGWINCH; the console width is refreshed on the next trigger
+        self._resized = False
+        # Runs the log-filename summary request alongside the explanation
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        # Log writes happen off the interactive path; None stops the worker.
+        # The worker thread is started by run() after pty.fork(), so the
+        # child never inherits a half-copied thread
+        self._log_queue = queue.SimpleQueue()
+        self._log_thread = None
         self._init_llm()
 
     def _init_llm(self):
 
-        
-        if self.config.provider == "openai":
+        llm = getattr(self, 'llm', None)
+        if (self.config.provider == "openai" and isinstance(llm, OpenAIProvider)) or \
+                (self.config.provider == "gemini" and isinstance(llm, GeminiProvider)):
+            # Only the language changes after startup; keep the warm client
+            llm.set_language(self.config.language)
+        elif self.config.provider == "openai":
             self.llm = OpenAIProvider(self.config.api_key, self.config.model, self.config.base_url, self.config.language)
         elif self.config.provider == "gemini":
             self.llm = GeminiProvider(self.config.api_key, self.config.model, self.config.language)
         else:
             print(f"Warning: Unknown provider {self.config.provider}")
             self.llm = None
+        # First answers keyed by a hash of the analyzed output; they depend on
+        # the provider and language, so start afresh whenever those change
+        self._explain_cache = OrderedDict()
         
 
         
-        log_summary_length = getattr(self.config, 'log_summary_length', 50)
-        self.logger = ConversationLogger(log_summary_length=log_summary_length)
+        # Resolved once here rather than on every trigger
+        self._max_context_chars = getattr(self.config, 'max_context_chars', 10000)
+        self._log_summary_length = getattr(self.config, 'log_summary_length', 50)
+        self.logger = ConversationLogger(log_summary_length=self._log_summary_length)
+
+        # Fixed parts of every trigger's prompts, shared instead of rebuilt
+        self._system_msg = {"role": "system", "content": self.llm.system_prompt} if self.llm else None
+        # The summary supplies its own system message, so it carries the
+        # language instruction itself
+        answer_language = "Chinese" if self.config.language == 'cn' else "English"
+        self._summary_system_msg = {"role": "system", "content": f"You are a helpful assistant. Always answer in {answer_language}."}
+        self._summary_prefix = (
+            f"Summarize the following terminal output in one sentence (max {self._log_summary_length} chars) "
+            "for a filename. Do not use special characters. Output:\n"
+        )
 
     def run(self):
         """
@@ -80,8 +175,18 @@ class TerminalMonitor:
         else:
             # Parent process (the monitor)
             try:
+                self._log_thread = threading.Thread(target=self._log_worker, daemon=True)
+                self._log_thread.start()
+
                 if self.old_tty:
-                    tty.setraw(sys.stdin.fileno())
+                    tty.setraw(self._stdin_fd)
+
+                if hasattr(signal, 'SIGWINCH'):
+                    signal.signal(signal.SIGWINCH, self._on_resize)
+
+                # Non-blocking so each select wake can drain all ready output
+                flags = fcntl.fcntl(master_fd, fcntl.F_GETFL)
+                fcntl.fcntl(master_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
                 
                 self._io_loop(master_fd)
                 
@@ -91,77 +196,248 @@ class TerminalMonitor:
                 if self.old_tty:
                     termios.tcsetattr(sys.stdin, termios.TCSADRAIN, self.old_tty)
                 os.close(master_fd)
+                # Drain pending log writes before closing the log file
+                if self._log_thread is not None:
+                    self._log_queue.put(None)
+                    self._log_thread.join()
+                self.logger.close()
+                self._executor.shutdown(wait=False)
                 # Wait for child to exit
                 os.waitpid(pid, 0)
 
     def _io_loop(self, master_fd):
-        
+        """
+        Relays stdin to the shell and shell output to stdout, capturing the
+        output for analysis. Per-byte work stays in C (selector wait, bulk
+        reads, writev, one regex prefilter, then translate and membership
+        tests), so Python runs once per burst rather than once per byte.
+        """
         # Buffer for the current command output
-        self.output_buffer = b""
+        self.output_buffer = bytearray()
         # Buffer for the current command input (to detect Enter)
-        self.input_buffer = b""
+        self.input_buffer = bytearray()
+        # Only the tail is ever analyzed; UTF-8 is at most 4 bytes per char
+        max_bytes = self._max_context_chars * 4
+
+        # Bind hot-path lookups to locals once, outside the loop
+        stdin_fd = self._stdin_fd
+        stdout_fd = self._stdout_fd
+        _read = os.read
+        _writev = os.writev
+
+        # Registrations persist across iterations (epoll on Linux), unlike
+        # select() which rebuilds its fd sets on every call. Level-triggered
+        # on purpose: stdin stays blocking (it is shared with the parent
+        # shell) and the pty drain is capped per wake, and edge-triggered
+        # mode would lose wakeups for data left unread in either case.
+        sel = selectors.DefaultSelector()
+        sel.register(stdin_fd, selectors.EVENT_READ, "stdin")
+        sel.register(master_fd, selectors.EVENT_READ, "pty")
+        _select = sel.select
+        output_buffer = self.output_buffer
+        output_extend = output_buffer.extend
         
+        try:
+            while True:
+                try:
+                    ready = [key.data for key, _ in _select()]
+                except OSError:
+                    break
+                
+                if "stdin" in ready:
+                    # Read from stdin
+                    try:
+                        d = _read(stdin_fd, _STDIN_READ_SIZE)
+                        if not d:
+                            break
+                        
+                        # One scan for Ctrl+G, \r or \n; ordinary keystrokes
+                        # and pastes without them skip the checks below
+                        if _SPECIAL_KEYS_RE.search(d) is not None:
+                            # Check for trigger key (Ctrl+G = \x07) and remove it
+                            # in the same pass so the shell doesn't see it
+                            stripped = d.translate(None, _TRIGGER_KEY)
+                            if len(stripped) != len(d):
+                                self.trigger_analysis()
+                                d = stripped
+                                if not d:
+                                    continue
+
+                            # Check for Enter (\r or \n) to reset buffer
+                            if b'\r' in d or b'\n' in d:
+                                self.last_command_output = output_buffer
+                                output_buffer = self.output_buffer = bytearray()
+                                output_extend = output_buffer.extend
+                        
+                        _write_all(master_fd, d)
+                    except OSError:
+                        break
+                
+                if "pty" in ready:
+                    # Read from master_fd (shell output) until it would block.
+                    # The bytes go through userspace on purpose: they must also be
+                    # captured for analysis, and os has no tee(2) to let a
+                    # zero-copy os.splice() forward them while keeping a copy.
+                    closed = False
+                    chunks = []
+                    for _ in range(_MAX_DRAIN_READS):
+                        try:
+                            o = _read(master_fd, _READ_SIZE)
+                        except BlockingIOError:
+                            break
+                        except OSError:
+                            closed = True
+                            break
+                        if not o:
+                            closed = True
+                            break
+                        chunks.append(o)
+
+                    if chunks:
+                        # Write the whole burst to real stdout in one syscall
+                        try:
+                            written = _writev(stdout_fd, chunks)
+                            if written < sum(map(len, chunks)):
+                                _write_all(stdout_fd, b"".join(chunks)[written:])
+                        except OSError:
+                            break
+                        
+                        # Buffer the output
+                        for o in chunks:
+                            output_extend(o)
+                        # Trim back to max_bytes only once it doubles, so the
+                        # head deletion is amortized across many bursts
+                        if len(output_buffer) > 2 * max_bytes:
+                            del output_buffer[:-max_bytes]
+
+                    if closed:
+                        break
+        finally:
+            sel.close()
+
+    def _log_worker(self):
         while True:
-            try:
-                r, w, e = select.select([sys.stdin, master_fd], [], [])
-            except OSError:
+            item = self._log_queue.get()
+            if item is None:
                 break
-            
-            if sys.stdin in r:
-                # Read from stdin
+            log_context, explanation, summary = item
+            try:
+                self.logger.log(log_context, explanation, summary=summary)
+            except Exception as e:
+                # Report and keep serving later entries; the terminal is in
+                # raw mode, so lines need an explicit \r
+                os.write(self._stdout_fd, f"\r\n\033[1;31m[SmartTerm] Error writing log: {e}\033[0m\r\n".encode())
+
+    @staticmethod
+    def _terminal_width():
+        return shutil.get_terminal_size().columns or 80
+
+    def _on_resize(self, signum, frame):
+        self._resized = True
+
+    def _render_stream(self, chunks):
+        """
+        Renders streamed LLM output live and returns (text, completed), where
+        completed is False if the stream failed part way.
+        """
+        def panel(body):
+            return Panel(Markdown(body), title="SmartTerm AI Suggestion", border_style="green")
+
+        text = ""
+        rendered_len = 0
+        completed = True
+        # The live view is cleared on exit and clips to the screen height, as
+        # "visible" overflow reprints long answers on every refresh; the final
+        # panel is printed once afterwards
+        try:
+            with Live(panel(text), console=self._console, refresh_per_second=10,
+                      transient=True, vertical_overflow="ellipsis") as live:
                 try:
-                    d = os.read(sys.stdin.fileno(), 1024)
-                    if not d:
-                        break
-                    
-                    # Check for trigger key (Ctrl+G = \x07)
-                    if b'\x07' in d:
-                        self.trigger_analysis()
-                        # Remove trigger key from input so shell doesn't see it
-                        d = d.replace(b'\x07', b'')
-                        if not d:
+                    for chunk in chunks:
+                        if not chunk:
                             continue
+                        text += chunk
+                        # Markdown parses the whole text on construction, so only
+                        # rebuild it per line or every _RENDER_MIN_CHARS characters
+                        if '\n' in chunk or len(text) - rendered_len >= _RENDER_MIN_CHARS:
+                            live.update(panel(text))
+                            rendered_len = len(text)
+                except LLMStreamError as e:
+                    # Keep whatever arrived and show the error after it
+                    text = f"{text}\n\n{e}" if text else str(e)
+                    completed = False
+        finally:
+            # Also keeps the partial answer on screen after Ctrl+C
+            self._console.print(panel(text))
+        return text, completed
+
+    def _show_explanation(self, explanation):
+        """
+        Displays a complete (non-streamed or cached) LLM response the same
+        way _render_stream leaves a streamed one.
+        """
+        print() # Newline
+        self._console.print(Panel(Markdown(explanation), title="SmartTerm AI Suggestion", border_style="green"))
+        print() # Newline
 
-                    # Check for Enter (\r or \n) to reset buffer
-                    if b'\r' in d or b'\n' in d:
-                        self.last_command_output = self.output_buffer
-                        self.output_buffer = b""
-                    
-                    os.write(master_fd, d)
-                except OSError:
-                    break
+    def _generate_summary(self, output_to_analyze):
+        """
+        Returns a short log filename summary of the output, only asking the
+        LLM when no command or error line can be picked out directly.
+        """
+        log_summary_length = self._log_summary_length
+        for pattern in _SUMMARY_PATTERNS:
+            m = pattern.search(output_to_analyze)
+            if m and len(m.group(1)) <= log_summary_length:
+                return m.group(1)
+
+        generated_summary = None
+        try:
+            summary_prompt = [
+                self._summary_system_msg,
+                {"role": "user", "content": self._summary_prefix + output_to_analyze}
+            ]
+            if hasattr(self.llm, 'chat'):
+                # A one-off request: this runs on the executor thread, so it
+                # must not share the provider's cached chat sessions
+                generated_summary = self.llm.chat(summary_prompt, cache=False)
+            else:
+                # Fallback
+                generated_summary = self.llm.generate_explanation(f"Summarize this for a filename (max {log_summary_length} chars): {output_to_analyze}")
             
-            if master_fd in r:
-                # Read from master_fd (shell output)
-                try:
-                    o = os.read(master_fd, 10240)
-                    if not o:
-                        break
-                    
-                    # Write to real stdout
-                    os.write(sys.stdout.fileno(), o)
-                    
-                    # Buffer the output
-                    self.output_buffer += o
-                    
-                except OSError:
-                    break
+            # Clean up summary
+            if generated_summary:
+                generated_summary = generated_summary.strip().replace('\n', ' ').replace('\r', '')
+        except Exception:
+            # Printing here would interleave with the streamed answer; the
+            # logger derives the filename from the output instead
+            generated_summary = None
+        return generated_summary
 
     def trigger_analysis(self):
         """
         Called when user triggers the AI analysis.
         """
+        if self._resized:
+            self._resized = False
+            self._console.width = self._terminal_width()
 
 
-        output_to_analyze = self.output_buffer.decode('utf-8', errors='replace')
+        # Only the tail can be sent, so decode at most max_chars * 4 bytes
+        # (UTF-8 is at most 4 bytes per char) however large the buffer is
+        max_chars = self._max_context_chars
+        max_bytes = max_chars * 4
+
+        source = self.output_buffer
+        output_to_analyze = _ANSI_RE.sub('', source[-max_bytes:].decode('utf-8', errors='replace'))
         if not output_to_analyze.strip():
             # If current buffer is empty, maybe they want to analyze the PREVIOUS command?
             if hasattr(self, 'last_command_output') and self.last_command_output:
-                output_to_analyze = self.last_command_output.decode('utf-8', errors='replace')
+                source = self.last_command_output
+                output_to_analyze = _ANSI_RE.sub('', source[-max_bytes:].decode('utf-8', errors='replace'))
         
         if not output_to_analyze.strip():
-            msg = "\r\n\033[1;33m[SmartTerm] No output to analyze.\033[0m\r\n"
-            os.write(sys.stdout.fileno(), msg.encode())
+            os.write(self._stdout_fd, _MSG_NO_OUTPUT)
             return
 
         # Temporarily restore TTY to cooked mode for user interaction
@@ -177,15 +453,16 @@ class TerminalMonitor:
         except:
             pass
 
+        # Status lines are collected and written with a single syscall
+        status = []
+
         # Truncate output if it exceeds max_context_chars
-        max_chars = getattr(self.config, 'max_context_chars', 10000)
-        if len(output_to_analyze) > max_chars:
-            output_to_analyze = output_to_analyze[-max_chars:]
-            msg = f"\r\n\033[1;33m[SmartTerm] Output truncated to last {max_chars} chars.\033[0m"
-            os.write(sys.stdout.fileno(), msg.encode())
-
-        msg = f"\r\n\033[1;34m[SmartTerm] Analyzing {len(output_to_analyze)} chars...\033[0m\r\n"
-        os.write(sys.stdout.fileno(), msg.encode())
+        if len(output_to_analyze) > max_chars or len(source) > max_bytes:
+            output_to_analyze = "...[truncated]...\n" + output_to_analyze[-max_chars:]
+            status += (_MSG_TRUNCATED_HEAD, str(max_chars).encode(), _MSG_TRUNCATED_TAIL)
+
+        status += (_MSG_ANALYZING_HEAD, str(len(output_to_analyze)).encode(), _MSG_ANALYZING_TAIL)
+        os.write(self._stdout_fd, b"".join(status))
         
         # Flag to track if we exited via Ctrl+C
         interrupted = False
@@ -193,54 +470,60 @@ class TerminalMonitor:
         if self.llm:
             # Initialize chat messages
             messages = [
-                {"role": "system", "content": self.llm.system_prompt},
-                {"role": "user", "content": f"Terminal output:\n{output_to_analyze}"}
+                self._system_msg,
+                {"role": "user", "content": "Terminal output:\n" + output_to_analyze}
             ]
 
-            console = Console(force_terminal=True, width=80)
+            # Identical output analyzed recently: replay the cached first
+            # answer instead of making any LLM calls
+            cache_key = hashlib.blake2b(output_to_analyze.encode('utf-8', errors='replace'), digest_size=16).digest()
+            cached = self._explain_cache.get(cache_key)
+            generated_summary = None
+            summary_future = None
+            if cached is not None:
+                self._explain_cache.move_to_end(cache_key)
+            else:
+                # The filename summary depends only on the output, so request it
+                # once, concurrently with the first explanation
+                summary_future = self._executor.submit(self._generate_summary, output_to_analyze)
 
             while True:
                 try:
-                    # Get response from LLM
-                    if hasattr(self.llm, 'chat'):
-                        explanation = self.llm.chat(messages)
+                    # Only answers known to be complete are cached; chat()
+                    # reports failures in its reply text
+                    completed = False
+                    if cached is not None:
+                        explanation, generated_summary = cached
+                        cached = None
+                        self._show_explanation(explanation)
                     else:
-                        # Fallback for providers without chat
-                        explanation = self.llm.generate_explanation(output_to_analyze)
-
-                    # Display response
-                    print() # Newline
-                    console.print(Panel(Markdown(explanation), title="SmartTerm AI Suggestion", border_style="green"))
-                    print() # Newline
-
-                    # Generate summary for log filename
-                    log_summary_length = getattr(self.config, 'log_summary_length', 50)
-                    generated_summary = None
-                    try:
-                        summary_prompt = [
-                            {"role": "system", "content": "You are a helpful assistant."},
-                            {"role": "user", "content": f"Summarize the following terminal output in one sentence (max {log_summary_length} chars) for a filename. Do not use special characters. Output:\n{output_to_analyze}"}
-                        ]
-                        if hasattr(self.llm, 'chat'):
-                            # We use a separate chat call, but we don't want to mess up the main conversation history if possible.
-                            # Actually, self.llm.chat takes messages. We can just call it.
-                            # But wait, self.llm.chat might modify internal state for Gemini?
-                            # GeminiProvider.chat uses history but doesn't store it in the object (it creates a new chat session each time).
-                            # So it's safe.
-                            generated_summary = self.llm.chat(summary_prompt)
+                        # Get response from LLM
+                        if hasattr(self.llm, 'chat_stream'):
+                            # Render tokens as they arrive
+                            print() # Newline
+                            explanation, completed = self._render_stream(self.llm.chat_stream(messages))
+                            print() # Newline
                         else:
-                            # Fallback
-                            generated_summary = self.llm.generate_explanation(f"Summarize this for a filename (max {log_summary_length} chars): {output_to_analyze}")
-                        
-                        # Clean up summary
-                        if generated_summary:
-                            generated_summary = generated_summary.strip().replace('\n', ' ').replace('\r', '')
-                    except Exception as e:
-                        print(f"Error generating summary: {e}")
+                            if hasattr(self.llm, 'chat'):
+                                explanation = self.llm.chat(messages)
+                            else:
+                                # Fallback for providers without chat
+                                explanation = self.llm.generate_explanation(output_to_analyze)
+                            self._show_explanation(explanation)
+
+                    if summary_future is not None:
+                        # First turn: collect the background summary and
+                        # remember the answer if it streamed in full
+                        generated_summary = summary_future.result()
+                        summary_future = None
+                        if completed and explanation.strip():
+                            self._explain_cache[cache_key] = (explanation, generated_summary)
+                            if len(self._explain_cache) > _EXPLAIN_CACHE_SIZE:
+                                self._explain_cache.popitem(last=False)
 
                     # Log the interaction
                     log_context = messages[-1]["content"]
-                    self.logger.log(log_context, explanation, summary=generated_summary)
+                    self._log_queue.put((log_context, explanation, generated_summary))
 
                     # Append assistant response to history
                     messages.append({"role": "assistant", "content": explanation})
@@ -270,8 +553,7 @@ class TerminalMonitor:
                     break
             
         else:
-            msg = "\r\n\033[1;31m[SmartTerm] No LLM provider configured.\033[0m\r\n"
-            os.write(sys.stdout.fileno(), msg.encode())
+            os.write(self._stdout_fd, _MSG_NO_LLM)
 
         # Restore TTY to raw mode (or whatever it was before)
         if current_tty:
@@ -282,7 +564,7 @@ class TerminalMonitor:
 
         # If interrupted by user, send SIGINT to shell to print ^C and show prompt immediately
         if interrupted:
-            os.write(self.master_fd, b'\x03')
+            _write_all(self.master_fd, b'\x03')
 
 
 